@@ -2,6 +2,7 @@ from openai import OpenAI, AzureOpenAI
 from dotenv import load_dotenv
 from os import environ
 import json
+from AI.scheduler import scheduler, BATCH, LLMOverloaded, estimate_tokens
 
 load_dotenv()
 
@@ -19,16 +20,21 @@ import json
 client = AzureOpenAI(
     api_key=key,
     api_version="",  # or the version you're using
-    azure_endpoint=endpoint
+    azure_endpoint=endpoint,
+    max_retries=0  # 429s, timeouts and 5xx are retried by AI/scheduler.py, not hidden inside the SDK
 )
 
 
-def extract_medical_info(raw_text: str) -> dict:
+def extract_medical_info(raw_text: str, user_id: str = "default_user") -> dict:
     """
     Extract medications, vaccinations, allergies, and medical conditions from raw medical text.
 
+    Runs at batch priority through the shared LLM scheduler, so chat queries
+    are served first when both are waiting.
+
     Args:
         raw_text (str): Unstructured medical input text.
+        user_id (str): Uploading user, for per-user rate limiting.
 
     Returns:
         dict: Dictionary containing extracted fields.
@@ -69,10 +75,15 @@ Also provide the summary of the above extracted information in a human-readable
 """
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",  # use the correct deployment name here
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0
+        response = scheduler.run(
+            lambda: client.chat.completions.create(
+                model="gpt-4o",  # use the correct deployment name here
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0
+            ),
+            priority=BATCH,
+            user_id=user_id,
+            est_tokens=estimate_tokens(prompt, max_tokens=1000),
         )
 
         content = response.choices[0].message.content
@@ -81,6 +92,8 @@ Also provide the summary of the above extracted information in a human-readable
         print("⚠️ Could not parse JSON output. Raw response:")
         print(content)
         return {}
+    except LLMOverloaded:
+        raise
     except Exception as e:
         print(f"❌ Error during OpenAI call: {e}")
         return {}
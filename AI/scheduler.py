@@ -0,0 +1,338 @@
+import itertools
+import random
+import threading
+import time
+from os import environ
+from typing import Any, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+from openai import APIConnectionError, InternalServerError, RateLimitError
+
+load_dotenv()
+
+# Lower value = served first. Chat queries jump ahead of upload extraction.
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+# Per-user buckets are swept for idle users once this many exist
+USER_SWEEP_THRESHOLD = 1024
+# Retried with a short backoff for the caller only (APITimeoutError is an
+# APIConnectionError); unlike 429s they don't slow everyone else down
+TRANSIENT_ERRORS = (APIConnectionError, InternalServerError)
+
+
+class LLMOverloaded(Exception):
+    """Raised when a request is shed (queue full or waited too long)."""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def estimate_tokens(text: str, max_tokens: int = 0) -> int:
+    """Rough token estimate (~4 chars per token) plus the completion budget."""
+    return len(text) // 4 + max_tokens
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate` tokens/second up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` tokens are available (0 if available now)."""
+        self._refill(now)
+        # Never wait for more than a full bucket, or oversized requests would starve
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float, now: float):
+        """Remove tokens; the balance may go negative to record overspend."""
+        self._refill(now)
+        self.tokens -= amount
+
+
+class _Ticket:
+    __slots__ = ("priority", "seq", "user_id", "tokens", "enqueued")
+
+    def __init__(self, priority: int, seq: int, user_id: str, tokens: int):
+        self.priority = priority
+        self.seq = seq
+        self.user_id = user_id
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+
+    def __lt__(self, other: "_Ticket") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class LLMScheduler:
+    """
+    Shared admission control for Azure OpenAI calls.
+
+    Callers block in a priority queue until a concurrency slot, the global
+    and per-user request buckets, and the tokens-per-minute budget all allow
+    them through. Interactive requests are always granted before batch ones.
+    On a 429 the concurrency limit is halved and every caller pauses for the
+    server's Retry-After (or an exponential backoff); successes slowly grow
+    the limit back. Timeouts, connection errors and 5xx responses are retried
+    too, since the clients disable the SDK's own retries.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        global_rps: float = 10.0,
+        per_user_rps: float = 2.0,
+        tokens_per_minute: int = 60000,
+        max_queue: int = 100,
+        max_wait: float = 30.0,
+        max_retries: int = 3,
+    ):
+        self.max_concurrency = max_concurrency
+        self.concurrency_limit = max_concurrency
+        self.per_user_rps = per_user_rps
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+
+        self._global = TokenBucket(global_rps, max(1.0, global_rps))
+        self._tpm = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute)
+        self._users: Dict[str, TokenBucket] = {}
+        self._user_sweep_at = USER_SWEEP_THRESHOLD
+        self._waiting: list = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._successes = 0
+        self._cond = threading.Condition()
+
+        self._metrics = {
+            name: {"granted": 0, "shed": 0, "wait_total": 0.0, "wait_max": 0.0}
+            for name in PRIORITY_NAMES.values()
+        }
+        self._rate_limited = 0
+        self._transient_errors = 0
+
+    def _user_bucket(self, user_id: str) -> TokenBucket:
+        bucket = self._users.get(user_id)
+        if bucket is None:
+            if len(self._users) >= self._user_sweep_at:
+                self._evict_idle_users()
+            bucket = TokenBucket(self.per_user_rps, max(1.0, self.per_user_rps))
+            self._users[user_id] = bucket
+        return bucket
+
+    def _evict_idle_users(self):
+        """
+        Drop per-user buckets that have refilled to capacity.
+
+        A full bucket behaves exactly like a fresh one, so this loses no
+        state; it keeps memory bounded by recently active users rather than
+        every user_id ever seen.
+        """
+        now = time.monotonic()
+        for user_id, bucket in list(self._users.items()):
+            bucket._refill(now)
+            if bucket.tokens >= bucket.capacity:
+                del self._users[user_id]
+        # Amortise: sweep again only once the live set has doubled
+        self._user_sweep_at = max(USER_SWEEP_THRESHOLD, 2 * len(self._users))
+
+    def _wait_for(self, ticket: _Ticket, now: float) -> float:
+        """Seconds until ticket could be admitted on rate limits alone."""
+        return max(
+            self._paused_until - now,
+            self._global.wait_time(1, now),
+            self._user_bucket(ticket.user_id).wait_time(1, now),
+            self._tpm.wait_time(ticket.tokens, now),
+        )
+
+    def _next_grant(self, now: float) -> tuple:
+        """
+        Pick the best-ranked waiter that can run now.
+
+        Returns (ticket or None, seconds until something might become eligible).
+        A per-user limit on one waiter does not block others behind it.
+        """
+        if self._in_flight >= self.concurrency_limit:
+            return None, None
+        soonest = None
+        for ticket in sorted(self._waiting):
+            wait = self._wait_for(ticket, now)
+            if wait <= 0:
+                return ticket, None
+            soonest = wait if soonest is None else min(soonest, wait)
+        return None, soonest
+
+    def _acquire(self, priority: int, user_id: str, tokens: int) -> _Ticket:
+        name = PRIORITY_NAMES[priority]
+        with self._cond:
+            if len(self._waiting) >= self.max_queue:
+                self._metrics[name]["shed"] += 1
+                raise LLMOverloaded("LLM queue is full", retry_after=self.max_wait / 2)
+
+            ticket = _Ticket(priority, next(self._seq), user_id, tokens)
+            self._waiting.append(ticket)
+            deadline = ticket.enqueued + self.max_wait
+            try:
+                while True:
+                    now = time.monotonic()
+                    chosen, soonest = self._next_grant(now)
+                    if chosen is ticket:
+                        break
+                    if chosen is not None:
+                        # Someone else is eligible; make sure they wake up
+                        self._cond.notify_all()
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._metrics[name]["shed"] += 1
+                        raise LLMOverloaded("Timed out waiting for LLM capacity")
+                    self._cond.wait(min(remaining, soonest) if soonest else remaining)
+            finally:
+                self._waiting.remove(ticket)
+
+            self._global.take(1, now)
+            self._user_bucket(user_id).take(1, now)
+            self._tpm.take(tokens, now)
+            if self._waiting:
+                # Others may be eligible too; they'd otherwise sleep until a release
+                self._cond.notify_all()
+            self._in_flight += 1
+
+            waited = now - ticket.enqueued
+            stats = self._metrics[name]
+            stats["granted"] += 1
+            stats["wait_total"] += waited
+            stats["wait_max"] = max(stats["wait_max"], waited)
+            return ticket
+
+    def _release(self, ticket: _Ticket, used_tokens: Optional[int]):
+        with self._cond:
+            self._in_flight -= 1
+            if used_tokens is not None:
+                # Settle the estimate against what the API actually billed
+                self._tpm.take(used_tokens - ticket.tokens, time.monotonic())
+            self._cond.notify_all()
+
+    def _on_success(self):
+        with self._cond:
+            self._successes += 1
+            if self.concurrency_limit < self.max_concurrency and self._successes >= self.concurrency_limit:
+                self.concurrency_limit += 1
+                self._successes = 0
+                self._cond.notify_all()
+
+    def _on_rate_limited(self, error: RateLimitError, attempt: int) -> float:
+        delay = None
+        response = getattr(error, "response", None)
+        if response is not None:
+            try:
+                delay = float(response.headers.get("retry-after"))
+            except (TypeError, ValueError):
+                delay = None
+        if delay is None:
+            delay = min(30.0, 2 ** attempt) + random.uniform(0, 0.5)
+        with self._cond:
+            self._rate_limited += 1
+            self._successes = 0
+            self.concurrency_limit = max(1, self.concurrency_limit // 2)
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        return delay
+
+    def run(
+        self,
+        fn: Callable[[], Any],
+        priority: int = BATCH,
+        user_id: str = "default_user",
+        est_tokens: int = 0,
+    ) -> Any:
+        """
+        Run fn (an LLM call) once admitted, retrying on 429s and transient errors.
+
+        Args:
+            fn: Zero-argument callable that performs the request.
+            priority: INTERACTIVE or BATCH.
+            user_id: Key for the per-user rate limit.
+            est_tokens: Estimated prompt + completion tokens for the TPM budget.
+
+        Returns:
+            Whatever fn returns.
+
+        Raises:
+            LLMOverloaded: If the request is shed or 429s persist past max_retries.
+            APIConnectionError, InternalServerError: If they persist past max_retries.
+        """
+        for attempt in range(self.max_retries + 1):
+            ticket = self._acquire(priority, user_id, est_tokens)
+            used_tokens = None
+            backoff = 0.0
+            try:
+                result = fn()
+                usage = getattr(result, "usage", None)
+                used_tokens = getattr(usage, "total_tokens", None)
+            except RateLimitError as e:
+                delay = self._on_rate_limited(e, attempt)
+                if attempt == self.max_retries:
+                    raise LLMOverloaded("Azure OpenAI rate limit exceeded", retry_after=delay) from e
+                continue
+            except TRANSIENT_ERRORS:
+                if attempt == self.max_retries:
+                    raise
+                backoff = min(8.0, 0.5 * 2 ** attempt) + random.uniform(0, 0.25)
+            finally:
+                self._release(ticket, used_tokens)
+            if backoff:
+                # Back off without holding a slot, then queue again
+                with self._cond:
+                    self._transient_errors += 1
+                time.sleep(backoff)
+                continue
+            self._on_success()
+            return result
+
+    def metrics(self) -> Dict[str, Any]:
+        """Snapshot of queue depth, wait times, shed counts and limiter state."""
+        with self._cond:
+            depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            for ticket in self._waiting:
+                depth[PRIORITY_NAMES[ticket.priority]] += 1
+            per_priority = {}
+            for name, stats in self._metrics.items():
+                granted = stats["granted"]
+                per_priority[name] = {
+                    "queue_depth": depth[name],
+                    "granted": granted,
+                    "shed": stats["shed"],
+                    "wait_avg_s": round(stats["wait_total"] / granted, 4) if granted else 0.0,
+                    "wait_max_s": round(stats["wait_max"], 4),
+                }
+            return {
+                "in_flight": self._in_flight,
+                "concurrency_limit": self.concurrency_limit,
+                "rate_limited": self._rate_limited,
+                "transient_errors": self._transient_errors,
+                "tracked_users": len(self._users),
+                "paused_for_s": round(max(0.0, self._paused_until - time.monotonic()), 3),
+                "priorities": per_priority,
+            }
+
+
+scheduler = LLMScheduler(
+    max_concurrency=int(environ.get("LLM_MAX_CONCURRENCY", 8)),
+    global_rps=float(environ.get("LLM_GLOBAL_RPS", 10)),
+    per_user_rps=float(environ.get("LLM_PER_USER_RPS", 2)),
+    tokens_per_minute=int(environ.get("LLM_TOKENS_PER_MINUTE", 60000)),
+    max_queue=int(environ.get("LLM_MAX_QUEUE", 100)),
+    max_wait=float(environ.get("LLM_MAX_WAIT_SECONDS", 30)),
+)
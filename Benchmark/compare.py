@@ -0,0 +1,56 @@
+"""
+Compare two benchmark reports written by Benchmark/run.py.
+
+    python -m Benchmark.compare baseline.json candidate.json
+"""
+import argparse
+import json
+
+
+def change(old: float, new: float) -> str:
+    if not old:
+        return "    n/a"
+    return f"{(new - old) / old * 100:+6.1f}%"
+
+
+def rows(baseline: dict, candidate: dict):
+    """Yield (name, metric, old, new) for every latency/throughput figure present in both."""
+    for phase, old in baseline["results"].items():
+        new = candidate["results"].get(phase)
+        if new is None:
+            continue
+        yield phase, "throughput_rps", old["throughput_rps"], new["throughput_rps"]
+        if "quality" in old and "quality" in new:
+            yield phase, "quality", old["quality"], new["quality"]
+        if "context_tokens" in old and "context_tokens" in new:
+            yield phase, "context_tokens", old["context_tokens"]["mean"], new["context_tokens"]["mean"]
+        for metric in ("p50_ms", "p95_ms", "p99_ms"):
+            yield phase, metric, old["latency"][metric], new["latency"][metric]
+        for stage, old_stage in old["stages"].items():
+            new_stage = new["stages"].get(stage)
+            if new_stage is None:
+                continue
+            for metric in ("p50_ms", "p95_ms"):
+                yield f"{phase}.{stage}", metric, old_stage[metric], new_stage[metric]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"baseline:  {baseline['git_revision']} {baseline.get('label', '')}")
+    print(f"candidate: {candidate['git_revision']} {candidate.get('label', '')}")
+    print(f"{'phase/stage':28s} {'metric':15s} {'baseline':>10s} {'candidate':>10s} {'change':>8s}")
+    for name, metric, old, new in rows(baseline, candidate):
+        print(f"{name:28s} {metric:15s} {old:10.2f} {new:10.2f} {change(old, new):>8s}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Local stand-ins for Azure OpenAI and Azure AI Vision, for offline benchmarks.
+
+Point AZURE_OPENAI_ENDPOINT and AZURE_VISION_ENDPOINT at this server. Latency is
+configurable through environment variables:
+
+    FAKE_LLM_TTFT_MS         time to first token (default 300)
+    FAKE_LLM_TOKENS_PER_SEC  completion speed (default 80)
+    FAKE_LLM_ANSWER_TOKENS   length of chat answers (default 120)
+    FAKE_LLM_429_RATE        fraction of calls answered with 429 (default 0)
+    FAKE_OCR_LATENCY_MS      image analysis latency (default 800)
+
+Run with: uvicorn Benchmark.fake_services:app --port 8900
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from uuid import uuid4
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from Benchmark.synthetic import generate_record, png_source_text, record_to_text
+
+TTFT = float(os.getenv("FAKE_LLM_TTFT_MS", 300)) / 1000
+TOKENS_PER_SEC = float(os.getenv("FAKE_LLM_TOKENS_PER_SEC", 80))
+ANSWER_TOKENS = int(os.getenv("FAKE_LLM_ANSWER_TOKENS", 120))
+RATE_429 = float(os.getenv("FAKE_LLM_429_RATE", 0))
+OCR_LATENCY = float(os.getenv("FAKE_OCR_LATENCY_MS", 800)) / 1000
+
+MED_LINE = re.compile(r"^\d+\.\s+(.+?)\s+(\S+ (?:mg|mcg|units|puffs))\s+-\s+(\w+)\s+x\s+(.+)$", re.MULTILINE)
+
+app = FastAPI()
+stats = {"chat_calls": 0, "rate_limited": 0, "ocr_calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def extraction_answer(prompt: str) -> str:
+    """Pull the medication lines back out of a synthetic record so the JSON looks real."""
+    medications = [
+        {"name": name, "dose": dose, "frequency": freq, "duration": duration.strip()}
+        for name, dose, freq, duration in MED_LINE.findall(prompt)
+    ]
+
+    def field(label):
+        match = re.search(rf"^{label}: (.+)$", prompt, re.MULTILINE)
+        return [item.strip() for item in match.group(1).split(",")] if match else []
+
+    return json.dumps({
+        "medications": medications,
+        "vaccinations": field("Vaccination history"),
+        "allergies": field("Known allergies"),
+        "medical_conditions": field("Diagnosis"),
+    })
+
+
+def chat_answer(context: str, question: str, tokens: int) -> str:
+    """
+    Extractive stand-in for a grounded answer: quote the context lines that
+    share the most words with the question, up to the token limit.
+
+    This makes answer quality depend on what retrieval put in the prompt, so
+    the benchmark can score it.
+    """
+    # Ignore short words so "is"/"of"/"the" don't decide the ranking
+    asked = {word for word in re.findall(r"\w+", question.lower()) if len(word) > 3}
+    lines = [line.strip() for line in context.split("\n") if line.strip()]
+    ranked = sorted(lines, key=lambda line: len(asked & set(re.findall(r"\w+", line.lower()))), reverse=True)
+    answer = []
+    for line in ranked:
+        if count_tokens(" ".join(answer + [line])) > tokens:
+            break
+        answer.append(line)
+    return " ".join(answer) or "The context does not contain this information."
+
+
+@app.post("/openai/deployments/{deployment}/chat/completions")
+async def chat_completions(deployment: str, request: Request):
+    body = await request.json()
+    stats["chat_calls"] += 1
+    if RATE_429 and random.random() < RATE_429:
+        stats["rate_limited"] += 1
+        return JSONResponse(
+            status_code=429,
+            content={"error": {"code": "429", "message": "Rate limit is exceeded."}},
+            headers={"Retry-After": "1"},
+        )
+
+    messages = body.get("messages", [])
+    prompt = "\n".join(m.get("content", "") for m in messages)
+    if "Extract and return the following fields" in prompt:
+        content = extraction_answer(prompt)
+    else:
+        context = "\n".join(m.get("content", "") for m in messages if m.get("role") == "system")
+        question = "\n".join(m.get("content", "") for m in messages if m.get("role") == "user")
+        content = chat_answer(context, question, min(ANSWER_TOKENS, body.get("max_tokens") or ANSWER_TOKENS))
+
+    prompt_tokens = count_tokens(prompt)
+    completion_tokens = count_tokens(content)
+    stats["prompt_tokens"] += prompt_tokens
+    stats["completion_tokens"] += completion_tokens
+    await asyncio.sleep(TTFT + completion_tokens / TOKENS_PER_SEC)
+
+    return {
+        "id": f"chatcmpl-{uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": deployment,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+@app.post("/computervision/imageanalysis:analyze")
+async def analyze_image(request: Request):
+    image = await request.body()
+    stats["ocr_calls"] += 1
+    await asyncio.sleep(OCR_LATENCY)
+
+    # We can't read the pixels: synthetic images carry their source text in a
+    # PNG tEXt chunk; anything else gets a stable record derived from its hash
+    text = png_source_text(image)
+    if text is None:
+        seed = int.from_bytes(hashlib.sha256(image).digest()[:8], "big")
+        text = record_to_text(generate_record(random.Random(seed)))
+    lines = [
+        {"text": line, "boundingPolygon": [], "words": []}
+        for line in text.split("\n") if line.strip()
+    ]
+    return {
+        "modelVersion": "fake-2023-10-01",
+        "metadata": {"width": 827, "height": 1169},
+        "readResult": {"blocks": [{"lines": lines}]},
+    }
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
@@ -0,0 +1,105 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    """Parse 'name;dur=12.3, other;dur=4' into {name: ms}."""
+    timings = {}
+    for entry in filter(None, (part.strip() for part in header.split(","))):
+        name, _, params = entry.partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur":
+                timings[name.strip()] = float(value)
+    return timings
+
+
+def latency_summary(values: List[float]) -> Dict[str, float]:
+    return {
+        "p50_ms": round(percentile(values, 50), 2),
+        "p95_ms": round(percentile(values, 95), 2),
+        "p99_ms": round(percentile(values, 99), 2),
+        "mean_ms": round(sum(values) / len(values), 2) if values else 0.0,
+        "max_ms": round(max(values), 2) if values else 0.0,
+    }
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    requests: List[Callable[[httpx.AsyncClient], Any]],
+    concurrency: int,
+    checks: Optional[List[Callable[[httpx.Response], bool]]] = None,
+) -> Dict[str, Any]:
+    """
+    Fire requests with at most `concurrency` in flight and summarise the results.
+
+    Args:
+        client: Shared HTTP client pointed at the app.
+        requests: Callables that take the client and return a response coroutine.
+        concurrency: Maximum number of requests in flight.
+        checks: Optional per-request answer checks; the share of successful
+            responses passing them is reported as quality.
+
+    Returns:
+        Throughput, status counts, answer quality, context tokens, and
+        end-to-end and per-stage latency percentiles.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    stages: Dict[str, List[float]] = {}
+    statuses: Dict[str, int] = {}
+    context_tokens: List[int] = []
+    passed: List[bool] = []
+
+    async def one(make_request, check):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await make_request(client)
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                response, status = None, type(e).__name__
+            elapsed = (time.perf_counter() - start) * 1000
+        statuses[status] = statuses.get(status, 0) + 1
+        if response is not None and response.status_code == 200:
+            latencies.append(elapsed)
+            for name, ms in parse_server_timing(response.headers.get("server-timing", "")).items():
+                stages.setdefault(name, []).append(ms)
+            if "x-context-tokens" in response.headers:
+                context_tokens.append(int(response.headers["x-context-tokens"]))
+            if check is not None:
+                passed.append(check(response))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(r, c) for r, c in zip(requests, checks or [None] * len(requests))))
+    wall = time.perf_counter() - start
+
+    summary = {
+        "requests": len(requests),
+        "ok": len(latencies),
+        "statuses": statuses,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 3) if wall else 0.0,
+        "latency": latency_summary(latencies),
+        "stages": {name: latency_summary(values) for name, values in stages.items()},
+    }
+    if context_tokens:
+        summary["context_tokens"] = {
+            "mean": round(sum(context_tokens) / len(context_tokens), 1),
+            "p95": percentile(context_tokens, 95),
+        }
+    if passed:
+        summary["quality"] = round(sum(passed) / len(passed), 4)
+    return summary
@@ -0,0 +1,231 @@
+"""
+Offline load test for /upload/ and /query/.
+
+Starts the fake Azure OpenAI / Vision server (Benchmark/fake_services.py), the
+app against a local Chroma store and the Firestore emulator, then drives
+synthetic uploads and chat queries and writes a JSON report.
+
+    python -m Benchmark.run --uploads 40 --queries 200 --concurrency 8
+    python -m Benchmark.run --label new --out Benchmark/results/new.json
+
+    # Retrieval as it was before dedupe/rerank/packing: top-k only, no budget
+    python -m Benchmark.run --candidate-multiplier 1 --rerank-model "" --context-budget 1000000 --label old --out Benchmark/results/old.json
+    python -m Benchmark.compare Benchmark/results/old.json Benchmark/results/new.json
+
+The Firestore emulator is used if FIRESTORE_EMULATOR_HOST is already set;
+otherwise it is started with `gcloud emulators firestore start`.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from Benchmark.load import drive
+from Benchmark.synthetic import generate_corpus, generate_queries
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "Benchmark", "results")
+
+
+def spawn(args, env, log_path):
+    # The child keeps its own copy of the log descriptor; ours is closed on return.
+    # A new session lets stop() reach grandchildren (gcloud runs the emulator in Java).
+    with open(log_path, "wb") as log:
+        return subprocess.Popen(
+            args, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT, start_new_session=True
+        )
+
+
+def stop(process, timeout: float = 30.0):
+    """Terminate a spawned process group, killing it if it hasn't exited within timeout."""
+    if process.poll() is not None:
+        return
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+    except ProcessLookupError:
+        process.wait()
+
+
+def wait_until_up(url: str, timeout: float = 120.0):
+    """Poll url until the server answers (the app loads the embedding model on start)."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=2)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.5)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def upload_request(item, user_id):
+    files = {"file": (item["filename"], item["body"], item["content_type"])}
+    return lambda client: client.post("/upload/", params={"user_id": user_id}, files=files)
+
+
+def query_request(query, user_id):
+    return lambda client: client.post("/query/", json={"query": query, "user_id": user_id})
+
+
+def answer_check(expected):
+    """Pass if the answer mentions the expected term from the synthetic record."""
+    return lambda response: expected.lower() in response.json().get("response", "").lower()
+
+
+def query_phase(queries, users):
+    """Requests and answer checks for a list of generated queries."""
+    chats = [query_request(q["query"], users[i % len(users)]) for i, q in enumerate(queries)]
+    checks = [answer_check(q["expected"]) for q in queries]
+    return chats, checks
+
+
+async def run_phases(base_url, corpus, args):
+    users = [f"bench_user_{i}" for i in range(args.users)]
+    uploads = [upload_request(item, users[i % len(users)]) for i, item in enumerate(corpus)]
+    half = len(uploads) // 2
+    # Only ask about records that are already indexed when the queries run;
+    # the second half is still being uploaded during the mixed phase
+    indexed = corpus[:half]
+    chats, checks = query_phase(generate_queries(indexed, args.queries, seed=args.seed), users)
+    mixed_chats, mixed_checks = query_phase(generate_queries(indexed, args.queries // 2, seed=args.seed + 1), users)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout) as client:
+        results = {"upload": await drive(client, uploads[:half], args.concurrency)}
+        results["query"] = await drive(client, chats, args.concurrency, checks)
+        # Uploads and chat at the same time: the case the LLM scheduler prioritises
+        mixed_upload, mixed_query = await asyncio.gather(
+            drive(client, uploads[half:], args.concurrency),
+            drive(client, mixed_chats, args.concurrency, mixed_checks),
+        )
+        results["mixed_upload"] = mixed_upload
+        results["mixed_query"] = mixed_query
+        llm_metrics = (await client.get("/metrics/llm")).json()
+    return results, llm_metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uploads", type=int, default=40)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--llm-ttft-ms", type=float, default=300)
+    parser.add_argument("--llm-tokens-per-sec", type=float, default=80)
+    parser.add_argument("--llm-429-rate", type=float, default=0.0)
+    parser.add_argument("--ocr-latency-ms", type=float, default=800)
+    parser.add_argument("--context-budget", type=int, default=400, help="RAG context tokens")
+    parser.add_argument("--candidate-multiplier", type=int, default=4, help="Candidates retrieved per top-k chunk")
+    parser.add_argument("--rerank-model", default="cross-encoder/ms-marco-MiniLM-L-6-v2", help="'' disables reranking")
+    parser.add_argument("--app-port", type=int, default=8800)
+    parser.add_argument("--fake-port", type=int, default=8900)
+    parser.add_argument("--firestore-port", type=int, default=8901)
+    parser.add_argument("--label", default="", help="Free-form tag stored in the report")
+    parser.add_argument("--out", help="Report path (default: Benchmark/results/<timestamp>.json)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="carehack-bench-")
+    fake_url = f"http://127.0.0.1:{args.fake_port}"
+    env = dict(
+        os.environ,
+        FAKE_LLM_TTFT_MS=str(args.llm_ttft_ms),
+        FAKE_LLM_TOKENS_PER_SEC=str(args.llm_tokens_per_sec),
+        FAKE_LLM_429_RATE=str(args.llm_429_rate),
+        FAKE_OCR_LATENCY_MS=str(args.ocr_latency_ms),
+        AZURE_OPENAI_ENDPOINT=fake_url,
+        AZURE_OPENAI_API_KEY="bench",
+        AZURE_VISION_ENDPOINT=fake_url,
+        AZURE_VISION_KEY="bench",
+        CHROMA_PATH=os.path.join(workdir, "chroma"),
+        RAG_CONTEXT_TOKEN_BUDGET=str(args.context_budget),
+        RAG_CANDIDATE_MULTIPLIER=str(args.candidate_multiplier),
+        RERANK_MODEL=args.rerank_model,
+    )
+
+    processes = []
+    try:
+        if not env.get("FIRESTORE_EMULATOR_HOST"):
+            gcloud = shutil.which("gcloud")
+            if gcloud is None:
+                sys.exit("Set FIRESTORE_EMULATOR_HOST or install gcloud to start the Firestore emulator.")
+            host = f"127.0.0.1:{args.firestore_port}"
+            processes.append(spawn(
+                [gcloud, "emulators", "firestore", "start", f"--host-port={host}"],
+                env, os.path.join(workdir, "firestore.log"),
+            ))
+            wait_until_up(f"http://{host}")
+            env["FIRESTORE_EMULATOR_HOST"] = host
+
+        processes.append(spawn(
+            [sys.executable, "-m", "uvicorn", "Benchmark.fake_services:app", "--port", str(args.fake_port)],
+            env, os.path.join(workdir, "fake_services.log"),
+        ))
+        processes.append(spawn(
+            [sys.executable, "-m", "uvicorn", "app:app", "--port", str(args.app_port)],
+            env, os.path.join(workdir, "app.log"),
+        ))
+        app_url = f"http://127.0.0.1:{args.app_port}"
+        wait_until_up(f"{fake_url}/stats")
+        wait_until_up(f"{app_url}/metrics/llm")
+
+        print(f"Generating {args.uploads} synthetic records (logs in {workdir})")
+        corpus = generate_corpus(args.uploads, seed=args.seed)
+
+        results, llm_metrics = asyncio.run(run_phases(app_url, corpus, args))
+        fake_stats = httpx.get(f"{fake_url}/stats").json()
+    finally:
+        for process in reversed(processes):
+            stop(process)
+
+    report = {
+        "label": args.label,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "config": vars(args),
+        "results": results,
+        "llm_scheduler": llm_metrics,
+        "fake_services": fake_stats,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for phase, summary in results.items():
+        latency = summary["latency"]
+        extra = ""
+        if "context_tokens" in summary:
+            extra += f" ctx_tokens={summary['context_tokens']['mean']:.0f}"
+        if "quality" in summary:
+            extra += f" quality={summary['quality']:.2%}"
+        print(
+            f"{phase:13s} ok={summary['ok']}/{summary['requests']} "
+            f"rps={summary['throughput_rps']:.2f} p50={latency['p50_ms']:.0f}ms "
+            f"p95={latency['p95_ms']:.0f}ms p99={latency['p99_ms']:.0f}ms{extra}"
+        )
+    print(f"Report written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+import random
+import struct
+import zlib
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+import fitz  # PyMuPDF
+
+MEDICATIONS = [
+    ("Metformin", "500 mg", "BD"), ("Amlodipine", "5 mg", "OD"), ("Atorvastatin", "20 mg", "HS"),
+    ("Paracetamol", "650 mg", "SOS"), ("Amoxicillin", "500 mg", "TDS"), ("Pantoprazole", "40 mg", "OD"),
+    ("Losartan", "50 mg", "OD"), ("Levothyroxine", "50 mcg", "OD"), ("Salbutamol inhaler", "2 puffs", "SOS"),
+    ("Cetirizine", "10 mg", "HS"), ("Azithromycin", "500 mg", "OD"), ("Insulin glargine", "10 units", "HS"),
+]
+CONDITIONS = [
+    "Type 2 Diabetes Mellitus", "Essential Hypertension", "Hypothyroidism", "Bronchial Asthma",
+    "Dyslipidemia", "Gastroesophageal Reflux Disease", "Allergic Rhinitis", "Acute Pharyngitis",
+    "Iron Deficiency Anemia", "Migraine without aura",
+]
+ALLERGIES = ["Penicillin", "Sulfonamides", "Peanuts", "Latex", "Aspirin", "Shellfish", "None known"]
+VACCINES = ["COVID-19 (Covishield)", "Influenza", "Hepatitis B", "Tetanus toxoid", "Pneumococcal", "HPV"]
+TESTS = [
+    ("HbA1c", "%", 5.0, 10.5), ("Fasting blood sugar", "mg/dL", 80, 220), ("Hemoglobin", "g/dL", 8.5, 16.5),
+    ("TSH", "mIU/L", 0.4, 9.0), ("LDL cholesterol", "mg/dL", 70, 190), ("Serum creatinine", "mg/dL", 0.6, 1.8),
+]
+FIRST_NAMES = ["Anil", "Priya", "Rahul", "Fathima", "Joseph", "Lakshmi", "Arjun", "Meera", "Nikhil", "Sara"]
+LAST_NAMES = ["Nair", "Menon", "Kumar", "Thomas", "Pillai", "Varghese", "Iyer", "Das"]
+# PNG tEXt keyword carrying the source text, so the fake OCR can "read" it back
+PNG_TEXT_KEYWORD = b"CareHackSourceText"
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+RECORD_TYPES = ["Prescription", "Discharge Summary", "Progress Note", "Diagnostic Report"]
+DURATIONS = ["5 days", "7 days", "2 weeks", "1 month", "3 months", "as needed"]
+
+
+def generate_record(rng: random.Random) -> Dict:
+    """Generate one random structured medical record."""
+    visit = date(2025, 1, 1) + timedelta(days=rng.randrange(365))
+    medications = []
+    for name, dose, frequency in rng.sample(MEDICATIONS, rng.randint(1, 5)):
+        duration = "as needed" if frequency == "SOS" else rng.choice(DURATIONS[:-1])
+        medications.append({"name": name, "dose": dose, "frequency": frequency, "duration": duration})
+    tests = []
+    for name, unit, low, high in rng.sample(TESTS, rng.randint(0, 3)):
+        tests.append({"name": name, "result": f"{rng.uniform(low, high):.1f} {unit}"})
+    return {
+        "patient": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        "age": rng.randint(18, 85),
+        "type": rng.choice(RECORD_TYPES),
+        "date": visit.isoformat(),
+        "medications": medications,
+        "medical_conditions": rng.sample(CONDITIONS, rng.randint(1, 3)),
+        "allergies": rng.sample(ALLERGIES, rng.randint(1, 2)),
+        "vaccinations": rng.sample(VACCINES, rng.randint(0, 3)),
+        "tests": tests,
+    }
+
+
+def record_to_text(record: Dict, notes_paragraphs: int = 3) -> str:
+    """Render a record as the kind of free text a scanned prescription or summary contains."""
+    lines = [
+        "CITY GENERAL HOSPITAL - OUTPATIENT DEPARTMENT",
+        f"{record['type']}    Date: {record['date']}",
+        f"Patient: {record['patient']}    Age: {record['age']}",
+        "",
+        "Diagnosis: " + ", ".join(record["medical_conditions"]),
+        "Known allergies: " + ", ".join(record["allergies"]),
+        "Vaccination history: " + (", ".join(record["vaccinations"]) or "Not documented"),
+        "",
+        "Rx",
+    ]
+    for i, med in enumerate(record["medications"], 1):
+        lines.append(f"{i}. {med['name']} {med['dose']} - {med['frequency']} x {med['duration']}")
+    if record["tests"]:
+        lines.append("")
+        lines.append("Investigations:")
+        for test in record["tests"]:
+            lines.append(f"- {test['name']}: {test['result']}")
+    lines.append("")
+    # Filler clinical notes so chunking/embedding see realistic document lengths
+    for _ in range(notes_paragraphs):
+        condition = record["medical_conditions"][0]
+        lines.append(
+            f"Patient reviewed for follow-up of {condition}. Compliance with medication is reported "
+            "as satisfactory. Advised diet modification, regular exercise and review after the "
+            "course of treatment or earlier if symptoms worsen."
+        )
+    lines.append("")
+    lines.append("Signed: Dr. A. Sharma, MBBS MD")
+    return "\n".join(lines)
+
+
+def text_to_pdf(text: str) -> bytes:
+    """Lay text out on A4 pages and return the PDF bytes."""
+    doc = fitz.open()
+    lines = text.split("\n")
+    per_page = 50
+    for start in range(0, len(lines), per_page):
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, 545, 792), "\n".join(lines[start:start + per_page]), fontsize=10)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def text_to_png(text: str) -> bytes:
+    """Render the first page of text as a PNG, standing in for a phone photo of a record."""
+    doc = fitz.open(stream=text_to_pdf(text), filetype="pdf")
+    data = doc[0].get_pixmap(dpi=100).tobytes("png")
+    doc.close()
+    # Embed the source text in a tEXt chunk right after IHDR (always 8 + 25 bytes in)
+    payload = PNG_TEXT_KEYWORD + b"\0" + text.encode("latin-1", errors="replace")
+    chunk = struct.pack(">I", len(payload)) + b"tEXt" + payload
+    chunk += struct.pack(">I", zlib.crc32(chunk[4:]))
+    return data[:33] + chunk + data[33:]
+
+
+def png_source_text(data: bytes) -> Optional[str]:
+    """Return the text embedded by text_to_png, or None for other images."""
+    if not data.startswith(PNG_SIGNATURE):
+        return None
+    pos = len(PNG_SIGNATURE)
+    while pos + 8 <= len(data):
+        length, kind = struct.unpack(">I4s", data[pos:pos + 8])
+        body = data[pos + 8:pos + 8 + length]
+        if kind == b"tEXt":
+            keyword, _, text = body.partition(b"\0")
+            if keyword == PNG_TEXT_KEYWORD:
+                return text.decode("latin-1")
+        if kind == b"IEND":
+            break
+        pos += 12 + length
+    return None
+
+
+def generate_corpus(count: int, seed: int = 0, image_ratio: float = 0.3) -> List[Dict]:
+    """
+    Generate synthetic upload payloads.
+
+    Returns:
+        List of dicts with record, text, filename, content_type and body bytes.
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(count):
+        record = generate_record(rng)
+        text = record_to_text(record, notes_paragraphs=rng.randint(1, 8))
+        if rng.random() < image_ratio:
+            body, filename, content_type = text_to_png(text), f"record_{i}.png", "image/png"
+        else:
+            body, filename, content_type = text_to_pdf(text), f"record_{i}.pdf", "application/pdf"
+        corpus.append({
+            "record": record, "text": text, "filename": filename,
+            "content_type": content_type, "body": body,
+        })
+    return corpus
+
+
+def generate_queries(corpus: List[Dict], count: int, seed: int = 0) -> List[Dict]:
+    """
+    Generate chat questions about the synthetic records.
+
+    Returns:
+        List of dicts with the query and an expected term a correct answer
+        must mention, used to score answer quality offline.
+    """
+    rng = random.Random(seed + 1)
+    # (question, term a correct answer must mention)
+    templates = [
+        ("What medications is {patient} currently taking?", "{first_medication}"),
+        ("Is {patient} allergic to {allergy}?", "{allergy}"),
+        ("What is the dose and frequency of {medication} for {patient}?", "{dose}"),
+        ("Has {patient} been diagnosed with {condition}?", "{condition}"),
+        ("Which known allergies does {patient} have?", "{first_allergy}"),
+    ]
+    queries = []
+    for _ in range(count):
+        record = rng.choice(corpus)["record"]
+        medication = rng.choice(record["medications"])
+        fields = {
+            "patient": record["patient"],
+            "allergy": rng.choice(record["allergies"]),
+            "first_allergy": record["allergies"][0],
+            "medication": medication["name"],
+            "first_medication": record["medications"][0]["name"],
+            "dose": medication["dose"],
+            "condition": rng.choice(record["medical_conditions"]),
+        }
+        question, expected = rng.choice(templates)
+        queries.append({"query": question.format(**fields), "expected": expected.format(**fields)})
+    return queries
@@ -0,0 +1,155 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from AI.scheduler import estimate_tokens
+from Extract.timing import stage
+
+# Cross-encoder used to rerank retrieved chunks on CPU; set RERANK_MODEL="" to disable
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+# Chunks whose SimHash fingerprints differ in at most this many bits count as duplicates
+SIMHASH_MAX_DISTANCE = int(os.getenv("SIMHASH_MAX_DISTANCE", 3))
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", 4096))
+
+_TOKEN = re.compile(r"\w+")
+
+
+def simhash(text: str, shingle: int = 3) -> int:
+    """64-bit SimHash over word shingles; near-identical texts get nearby fingerprints."""
+    words = _TOKEN.findall(text.lower())
+    grams = [" ".join(words[i:i + shingle]) for i in range(max(1, len(words) - shingle + 1))]
+    weights = [0] * 64
+    for gram in grams:
+        h = int.from_bytes(hashlib.blake2b(gram.encode(), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def deduplicate(chunks: List[str], max_distance: int = SIMHASH_MAX_DISTANCE) -> List[str]:
+    """
+    Drop chunks that are near-duplicates of an earlier one.
+
+    Order is preserved, so the best-ranked copy of repeated content (e.g. the
+    same record uploaded twice) is the one kept.
+    """
+    kept, fingerprints = [], []
+    for chunk in chunks:
+        fingerprint = simhash(chunk)
+        if any(bin(fingerprint ^ other).count("1") <= max_distance for other in fingerprints):
+            continue
+        kept.append(chunk)
+        fingerprints.append(fingerprint)
+    return kept
+
+
+@lru_cache(maxsize=None)
+def get_cross_encoder(model_name: str):
+    """Load the reranker once per process."""
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(model_name, device="cpu")
+
+
+class _ScoreCache:
+    """Thread-safe LRU of (model, query, chunk) -> relevance score."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(model_name: str, query: str, chunk: str) -> str:
+        return hashlib.sha1(f"{model_name}\0{query}\0{chunk}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[float]:
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key: str, score: float):
+        with self._lock:
+            self._data[key] = score
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+
+_score_cache = _ScoreCache(RERANK_CACHE_SIZE)
+
+
+def rerank(query: str, chunks: List[str], model_name: str = RERANK_MODEL) -> List[str]:
+    """
+    Order chunks by cross-encoder relevance to query, best first.
+
+    Scores are cached per (query, chunk), so repeated questions over the same
+    records skip the model. Without a model the retrieval order is kept.
+    """
+    if not model_name or len(chunks) < 2:
+        return list(chunks)
+
+    keys = [_score_cache.key(model_name, query, chunk) for chunk in chunks]
+    scores = [_score_cache.get(key) for key in keys]
+    missing = [i for i, score in enumerate(scores) if score is None]
+    if missing:
+        predicted = get_cross_encoder(model_name).predict([(query, chunks[i]) for i in missing])
+        for i, score in zip(missing, predicted):
+            scores[i] = float(score)
+            _score_cache.put(keys[i], scores[i])
+
+    order = sorted(range(len(chunks)), key=lambda i: scores[i], reverse=True)
+    return [chunks[i] for i in order]
+
+
+def pack(chunks: List[str], token_budget: int) -> List[str]:
+    """Greedily take chunks in order while they fit in token_budget."""
+    packed, used = [], 0
+    for chunk in chunks:
+        tokens = estimate_tokens(chunk)
+        if used + tokens > token_budget:
+            continue
+        packed.append(chunk)
+        used += tokens
+    return packed
+
+
+def build_context(
+    query: str,
+    candidates: List[str],
+    token_budget: int,
+    timings: Optional[Dict[str, float]] = None,
+    stats: Optional[Dict[str, int]] = None,
+) -> str:
+    """
+    Turn retrieved candidates into the prompt context: dedupe, rerank, pack.
+
+    Args:
+        query: The user's question.
+        candidates: Retrieved chunks, nearest first.
+        token_budget: Maximum estimated tokens of context.
+        timings: Optional dict filled with per-stage milliseconds.
+        stats: Optional dict filled with candidate, unique, packed and context_tokens counts.
+
+    Returns:
+        Context string to place in the system prompt.
+    """
+    with stage(timings, "dedupe"):
+        unique = deduplicate(candidates)
+    with stage(timings, "rerank"):
+        ranked = rerank(query, unique)
+    packed = pack(ranked, token_budget)
+    context = "\n".join(packed)
+    if stats is not None:
+        stats.update(
+            candidates=len(candidates),
+            unique=len(unique),
+            packed=len(packed),
+            context_tokens=estimate_tokens(context),
+        )
+    return context
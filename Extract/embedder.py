@@ -1,22 +1,48 @@
 import os
+from functools import lru_cache
 import openai
 from dotenv import load_dotenv
 
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
-def embed_texts(texts: list[str]) -> list[list[float]]:
+# Embedding model name -> backend. Vectors from different models are not
+# comparable, so every stored chunk and index is tagged with the model name.
+EMBEDDING_MODELS = {
+    "all-MiniLM-L6-v2": "sentence-transformers",
+    "text-embedding-3-large": "openai",
+}
+# Model used by indexes created before embeddings were versioned
+LEGACY_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+# Model new indexes are built with; existing ones move via Extract/reindex.py
+DEFAULT_EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", LEGACY_EMBEDDING_MODEL)
+
+
+@lru_cache(maxsize=None)
+def get_sentence_transformer(model_name: str):
+    """Load a SentenceTransformer once per process."""
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+
+def embed_texts(texts: list[str], model_name: str = DEFAULT_EMBEDDING_MODEL) -> list[list[float]]:
     """
-    Generate embeddings for a list of texts using OpenAI.
+    Generate embeddings for a list of texts.
 
     Args:
         texts: List of text chunks.
+        model_name: Key of EMBEDDING_MODELS.
 
     Returns:
         List of embedding vectors (float lists).
     """
-    response = openai.embeddings.create(
-        input=texts,
-        model="text-embedding-3-large"
-    )
-    return [embedding["embedding"] for embedding in response['data']]
+    backend = EMBEDDING_MODELS.get(model_name)
+    if backend == "sentence-transformers":
+        return get_sentence_transformer(model_name).encode(texts).tolist()
+    if backend == "openai":
+        response = openai.embeddings.create(
+            input=texts,
+            model=model_name
+        )
+        return [item.embedding for item in response.data]
+    raise ValueError(f"Unknown embedding model: {model_name}")
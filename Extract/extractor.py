@@ -1,4 +1,8 @@
+import io
+import mmap
 import os
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO, Union
 import fitz  # PyMuPDF
 from azure.ai.vision.imageanalysis import ImageAnalysisClient
 from azure.ai.vision.imageanalysis.models import VisualFeatures
@@ -14,27 +18,31 @@ VISION_KEY = os.getenv("AZURE_VISION_KEY")
 
 def extract_text_from_pdf(pdf_path: str) -> str:
     """Extract text from PDF using PyMuPDF."""
-    doc = fitz.open(pdf_path)
-    text = ""
-    for page in doc:
-        text += page.get_text()
-    return text
+    with fitz.open(pdf_path) as doc:
+        return "".join(page.get_text() for page in doc)
+
+def extract_text_from_pdf_bytes(data: Union[bytes, memoryview]) -> str:
+    """Extract text from an in-memory PDF using PyMuPDF (no temp file)."""
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        return "".join(page.get_text() for page in doc)
 
 def extract_text_from_image(image_path: str) -> str:
     """Extract text from an image file using Azure AI Vision."""
-    credential = AzureKeyCredential(VISION_KEY)
+    with open(image_path, "rb") as image_stream:
+        return extract_text_from_image_bytes(image_stream.read())
+
+def extract_text_from_image_bytes(data: Union[bytes, BinaryIO]) -> str:
+    """Extract text from image bytes, or a binary file object, using Azure AI Vision."""
     client = ImageAnalysisClient(
     endpoint=VISION_ENDPOINT,
     credential=AzureKeyCredential(VISION_KEY)
     )
 
-    # Open the image file in binary read mode
-    with open(image_path, "rb") as image_stream:
-        # Pass the image stream directly to the image_data parameter
-        result = client.analyze(
-            image_data=image_stream.read(), # Read the entire file content
-            visual_features=[VisualFeatures.READ]
-        )
+    # Pass the bytes or file straight through; the SDK streams file objects as the request body
+    result = client.analyze(
+        image_data=data,
+        visual_features=[VisualFeatures.READ]
+    )
 
     # Process the result to get the extracted text
     if result.read:
@@ -54,3 +62,28 @@ def extract_text(filepath: str) -> str:
         return extract_text_from_image(filepath)
     else:
         raise ValueError(f"Unsupported file type: {ext}")
+
+def extract_text_from_upload(buffer: BinaryIO, ext: str) -> str:
+    """
+    Same routing as extract_text, for an upload held in a BytesIO, a temp file
+    or Starlette's SpooledTemporaryFile (UploadFile.file).
+
+    The body is never copied: PDFs are parsed from a view of the in-memory
+    buffer (or an mmap of the file once it has spilled to disk) and images are
+    streamed to Azure Vision from it.
+    """
+    ext = ext.lower()
+    buffer.seek(0)
+    if ext == "pdf":
+        # SpooledTemporaryFile has no getbuffer() and fileno() would force it
+        # to disk, so work on the BytesIO or temp file it wraps
+        raw = buffer._file if isinstance(buffer, SpooledTemporaryFile) else buffer
+        if isinstance(raw, io.BytesIO):
+            with raw.getbuffer() as view:
+                return extract_text_from_pdf_bytes(view)
+        with mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+            return extract_text_from_pdf_bytes(view)
+    elif ext in ["jpg", "jpeg", "png", "bmp", "tiff"]:
+        return extract_text_from_image_bytes(buffer)
+    else:
+        raise ValueError(f"Unsupported file type: {ext}")
@@ -0,0 +1,163 @@
+import re
+import time
+from typing import Callable, Dict
+
+from chromadb.errors import NotFoundError
+
+from Extract.embedder import DEFAULT_EMBEDDING_MODEL, LEGACY_EMBEDDING_MODEL
+from Extract.vector_db import client
+
+# Readers re-check the pointer this often, so a switch is picked up within seconds
+POINTER_TTL_SECONDS = 5.0
+
+# index name -> (fetched at, pointer, {collection name: collection handle})
+_cache: Dict[str, tuple] = {}
+
+
+def _alias_name(index_name: str) -> str:
+    return f"{index_name}__alias"
+
+
+def versioned_collection_name(index_name: str, model_name: str) -> str:
+    """Physical collection holding index_name embedded with model_name."""
+    slug = re.sub(r"[^a-zA-Z0-9-]+", "-", model_name).strip("-").lower()
+    return f"{index_name}__{slug}"[:63]
+
+
+def _load_pointer(index_name: str) -> Dict:
+    try:
+        metadata = client.get_collection(name=_alias_name(index_name)).metadata or {}
+    except NotFoundError:
+        metadata = {}
+    if metadata:
+        return {
+            "collection": metadata.get("collection") or index_name,
+            "model": metadata.get("model") or LEGACY_EMBEDDING_MODEL,
+            "shadow_collection": metadata.get("shadow_collection") or "",
+            "shadow_model": metadata.get("shadow_model") or "",
+            "persisted": True,
+        }
+
+    try:
+        # Predates versioning: the bare collection was built with the legacy model
+        client.get_collection(name=index_name)
+        return {"collection": index_name, "model": LEGACY_EMBEDDING_MODEL,
+                "shadow_collection": "", "shadow_model": "", "persisted": True}
+    except NotFoundError:
+        # Brand-new index: built with EMBEDDING_MODEL once something is written
+        return {"collection": versioned_collection_name(index_name, DEFAULT_EMBEDDING_MODEL),
+                "model": DEFAULT_EMBEDDING_MODEL, "shadow_collection": "", "shadow_model": "",
+                "persisted": False}
+
+
+def _entry(index_name: str, use_cache: bool = True) -> tuple:
+    now = time.monotonic()
+    cached = _cache.get(index_name)
+    if use_cache and cached and now - cached[0] < POINTER_TTL_SECONDS:
+        return cached
+    entry = (now, _load_pointer(index_name), {})
+    _cache[index_name] = entry
+    return entry
+
+
+def get_pointer(index_name: str, use_cache: bool = True) -> Dict:
+    """
+    Return which collection and model serve index_name.
+
+    The pointer lives in the metadata of a small alias collection and is
+    replaced in a single write, so readers always see a consistent
+    collection/model pair. Indexes that predate versioning have no alias and
+    resolve to the bare collection with the legacy model; indexes that don't
+    exist yet resolve to EMBEDDING_MODEL.
+
+    Returns:
+        Dict with collection, model, and shadow_collection / shadow_model
+        (empty strings unless a re-index is in progress).
+    """
+    return _entry(index_name, use_cache)[1]
+
+
+def set_pointer(index_name: str, collection: str, model: str, shadow_collection: str = "", shadow_model: str = ""):
+    """Atomically replace the pointer for index_name."""
+    alias = client.get_or_create_collection(name=_alias_name(index_name))
+    # Always write every key: empty strings clear the shadow whatever the
+    # server's merge semantics for collection metadata are
+    alias.modify(metadata={
+        "collection": collection,
+        "model": model,
+        "shadow_collection": shadow_collection,
+        "shadow_model": shadow_model,
+        "updated": time.time(),
+    })
+    _cache.pop(index_name, None)
+
+
+def invalidate(index_name: str):
+    """Forget the cached pointer and collection handles for index_name."""
+    _cache.pop(index_name, None)
+
+
+def _collection(index_name: str, key: str = "collection") -> tuple:
+    """
+    Return (handle, pointer) for the collection pointer[key] names.
+
+    Handles are cached alongside the pointer so they're fetched once per TTL.
+    A persisted pointer names a collection that must exist; if it is gone, a
+    re-index switched away from it and dropped it, so the cached entry is
+    discarded and the pointer reloaded once rather than recreating an empty
+    collection under the old name.
+    """
+    for attempt in range(2):
+        _, pointer, handles = _entry(index_name, use_cache=not attempt)
+        name = pointer[key]
+        if name in handles:
+            return handles[name], pointer
+        try:
+            if pointer["persisted"]:
+                handles[name] = client.get_collection(name=name)
+            else:
+                handles[name] = client.get_or_create_collection(name=name)
+            return handles[name], pointer
+        except NotFoundError:
+            if attempt:
+                raise
+
+
+def resolve_index(index_name: str) -> tuple:
+    """Return (collection, model name) that reads of index_name should use."""
+    collection, pointer = _collection(index_name)
+    return collection, pointer["model"]
+
+
+def write_targets(index_name: str) -> list:
+    """
+    Return [(collection, model name)] that new chunks must be written to.
+
+    While a re-index is running this includes the shadow collection, so
+    uploads made during the migration are not lost on switch-over.
+    """
+    pointer = get_pointer(index_name)
+    if not pointer["persisted"]:
+        # First write to a new index: create it and record its model before any vectors exist
+        client.get_or_create_collection(name=pointer["collection"])
+        set_pointer(index_name, pointer["collection"], pointer["model"])
+    collection, pointer = _collection(index_name)
+    targets = [(collection, pointer["model"])]
+    if pointer["shadow_collection"]:
+        shadow, _ = _collection(index_name, "shadow_collection")
+        targets.append((shadow, pointer["shadow_model"]))
+    return targets
+
+
+def retry_on_switch(index_name: str, fn: Callable):
+    """
+    Call fn() and, if a collection handle it used was deleted by a re-index
+    switch in the meantime, reload the pointer and call it once more.
+
+    fn must resolve the index itself (resolve_index / write_targets).
+    """
+    try:
+        return fn()
+    except NotFoundError:
+        invalidate(index_name)
+        return fn()
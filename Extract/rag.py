@@ -1,10 +1,15 @@
 from openai import AzureOpenAI
 from os import environ
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
 import chromadb
 from chromadb.config import Settings
 from chromadb.errors import NotFoundError
+from AI.scheduler import scheduler, INTERACTIVE, estimate_tokens
+from Extract.timing import stage
+from Extract.embedder import embed_texts, get_sentence_transformer, EMBEDDING_MODELS, DEFAULT_EMBEDDING_MODEL
+from Extract.index import resolve_index, retry_on_switch
+from Extract.context import build_context, get_cross_encoder, RERANK_MODEL
+from Extract.vector_db import client
 
 # Load environment variables
 load_dotenv()
@@ -13,62 +18,74 @@ load_dotenv()
 endpoint = environ.get("AZURE_OPENAI_ENDPOINT")
 key = environ.get("AZURE_OPENAI_API_KEY")
 
-# Chroma credentials
-chromakey = environ.get("CHROMA_API_KEY")
+# Retrieve this many candidates per requested chunk, then dedupe/rerank/pack
+CANDIDATE_MULTIPLIER = int(environ.get("RAG_CANDIDATE_MULTIPLIER", 4))
+# Estimated tokens of context in the system prompt (~three 500-char chunks)
+CONTEXT_TOKEN_BUDGET = int(environ.get("RAG_CONTEXT_TOKEN_BUDGET", 400))
 
-# Initialize ChromaDB Cloud client
-client = chromadb.CloudClient(
-    api_key=chromakey,
-    tenant='',  # Replace with your actual tenant
-    database=''  # Replace with your actual DB name
-)
-
-# Create or get the document collection
+# The collection and embedding model are resolved per query from the index
+# pointer (Extract/index.py), so a re-index switches reads over atomically
 
-# Load embedding model
-embedder = SentenceTransformer('all-MiniLM-L6-v2')
+# Load the local embedding model up front so the first query doesn't pay for it
+if EMBEDDING_MODELS.get(DEFAULT_EMBEDDING_MODEL) == "sentence-transformers":
+    get_sentence_transformer(DEFAULT_EMBEDDING_MODEL)
+if RERANK_MODEL:
+    get_cross_encoder(RERANK_MODEL)
 
 # Initialize Azure OpenAI client
 llmclient = AzureOpenAI(
     api_key=key,
     api_version=" ",  # Adjust if your version differs
-    azure_endpoint=endpoint
+    azure_endpoint=endpoint,
+    max_retries=0  # 429s, timeouts and 5xx are retried by AI/scheduler.py, not hidden inside the SDK
 )
 
 # RAG function
-def rag_query(user_query, collection_name, top_k=3):
+def rag_query(user_query, collection_name, top_k=3, user_id=None, timings=None, stats=None):
     def get_or_create_collection(name):
         try:
             return client.get_collection(name=name)
         except NotFoundError:
             return client.create_collection(name=name)
-    collection = client.get_collection(name = "medical_docs")
+    def retrieve():
+        collection, model_name = resolve_index("medical_docs")
 
-    # Embed the query
-    query_embedding = embedder.encode([user_query]).tolist()[0]
+        # Embed the query with the same model the index was built with
+        with stage(timings, "embed"):
+            query_embedding = embed_texts([user_query], model_name=model_name)[0]
 
-    # Retrieve top-k similar documents from Chroma
-    results = collection.query(query_embeddings=[query_embedding], n_results=top_k)
+        # Retrieve candidate documents from Chroma
+        with stage(timings, "retrieve"):
+            return collection.query(query_embeddings=[query_embedding], n_results=top_k * CANDIDATE_MULTIPLIER)
+
+    # Re-resolves once if a re-index dropped the collection a cached handle pointed at
+    results = retry_on_switch("medical_docs", retrieve)
     retrieved_docs = results['documents'][0]
 
-    # Prepare system prompt with context
-    context = "\n".join(retrieved_docs)
+    # Prepare system prompt with deduplicated, reranked context packed into the token budget
+    context = build_context(user_query, retrieved_docs, CONTEXT_TOKEN_BUDGET, timings=timings, stats=stats)
     
     system_prompt = (
         "You are a helpful medical assistant. Use only the context below to answer the query.\n"
         f"Context:\n{context}"
     )
 
-    # Call Azure OpenAI
-    response = llmclient.chat.completions.create(
-        model="gpt-4o",  # Your Azure deployment name
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_query}
-        ],
-        temperature=0.3,
-        max_tokens=500,
-    )
+    # Call Azure OpenAI (interactive priority: jumps ahead of upload extraction)
+    with stage(timings, "llm"):
+        response = scheduler.run(
+            lambda: llmclient.chat.completions.create(
+                model="gpt-4o",  # Your Azure deployment name
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_query}
+                ],
+                temperature=0.3,
+                max_tokens=500,
+            ),
+            priority=INTERACTIVE,
+            user_id=user_id or collection_name,
+            est_tokens=estimate_tokens(system_prompt + user_query, max_tokens=500),
+        )
 
     return response.choices[0].message.content
 
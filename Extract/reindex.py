@@ -0,0 +1,192 @@
+"""
+Re-embed an index with a different model, then switch reads over atomically.
+
+Chunks are copied from the live collection into a shadow collection in large
+batches, embedded by a throttled process pool. New uploads are written to both
+collections while this runs. Re-running the same command resumes: chunks
+already in the shadow collection are skipped.
+
+    python -m Extract.reindex medical_docs --model text-embedding-3-large
+    python -m Extract.reindex medical_docs --status
+"""
+import argparse
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, List
+
+from Extract.embedder import EMBEDDING_MODELS, embed_texts, get_sentence_transformer
+from Extract.index import POINTER_TTL_SECONDS, get_pointer, set_pointer, versioned_collection_name
+from Extract.vector_db import client
+
+
+def _init_worker(model_name: str, threads: int):
+    """Load the model once per worker and keep torch from oversubscribing the CPU."""
+    if EMBEDDING_MODELS[model_name] == "sentence-transformers":
+        import torch
+        torch.set_num_threads(threads)
+        get_sentence_transformer(model_name)
+
+
+def _embed_batch(ids: List[str], documents: List[str], metadatas: List[dict], model_name: str) -> tuple:
+    return ids, documents, metadatas, embed_texts(documents, model_name=model_name)
+
+
+def reindex(
+    index_name: str,
+    model_name: str,
+    batch_size: int = 512,
+    workers: int = 2,
+    max_chunks_per_sec: float = 0,
+    drop_old: bool = False,
+    progress: Callable[[str], None] = print,
+) -> Dict[str, float]:
+    """
+    Build a shadow collection for index_name embedded with model_name and switch to it.
+
+    Args:
+        index_name: Logical index, e.g. "medical_docs".
+        model_name: Key of EMBEDDING_MODELS to re-embed with.
+        batch_size: Chunks read, embedded and written per batch.
+        workers: Embedding processes; at most 2 * workers batches are in flight.
+        max_chunks_per_sec: Throttle for shared hosts or rate-limited APIs (0 = off).
+        drop_old: Delete the previous collection after switching.
+        progress: Callback for progress lines.
+
+    Returns:
+        Dict with copied, skipped, elapsed_s and chunks_per_sec.
+    """
+    if model_name not in EMBEDDING_MODELS:
+        raise ValueError(f"Unknown embedding model: {model_name}")
+
+    pointer = get_pointer(index_name, use_cache=False)
+    if pointer["model"] == model_name:
+        progress(f"{index_name} already uses {model_name}")
+        return {"copied": 0, "skipped": 0, "elapsed_s": 0.0, "chunks_per_sec": 0.0}
+    if pointer["shadow_model"] and pointer["shadow_model"] != model_name:
+        raise ValueError(f"{index_name} is already being re-indexed to {pointer['shadow_model']}")
+
+    source = client.get_collection(name=pointer["collection"])
+    shadow_name = pointer["shadow_collection"] or versioned_collection_name(index_name, model_name)
+    shadow = client.get_or_create_collection(name=shadow_name, metadata={"embedding_model": model_name})
+
+    # Start dual writes, then give every reader's pointer cache time to see them
+    set_pointer(index_name, pointer["collection"], pointer["model"], shadow_name, model_name)
+    time.sleep(POINTER_TTL_SECONDS)
+
+    total = source.count()
+    copied = skipped = submitted = offset = 0
+    start = time.monotonic()
+
+    def write(future):
+        nonlocal copied
+        ids, documents, metadatas, embeddings = future.result()
+        shadow.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+        copied += len(ids)
+        elapsed = time.monotonic() - start
+        rate = copied / elapsed if elapsed else 0.0
+        remaining = max(0, total - copied - skipped)
+        shadow.modify(metadata={"embedding_model": model_name, "reindexed": copied + skipped, "total": total})
+        progress(
+            f"{copied + skipped}/{total} chunks ({rate:.0f} chunks/s"
+            + (f", ETA {remaining / rate:.0f}s)" if rate else ")")
+        )
+
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_name, threads)) as pool:
+        pending = set()
+        # count() is re-read so chunks added before dual writes began are still covered
+        while offset < source.count():
+            page = source.get(limit=batch_size, offset=offset, include=["documents", "metadatas"])
+            if not page["ids"]:
+                break
+            offset += len(page["ids"])
+            total = max(total, offset)
+
+            # Resume support: skip anything a previous run already copied
+            existing = set(shadow.get(ids=page["ids"], include=[])["ids"])
+            todo = [
+                (chunk_id, document, dict(metadata or {}, embedding_model=model_name))
+                for chunk_id, document, metadata in zip(page["ids"], page["documents"], page["metadatas"])
+                if chunk_id not in existing
+            ]
+            skipped += len(existing)
+            if todo:
+                ids, documents, metadatas = map(list, zip(*todo))
+                pending.add(pool.submit(_embed_batch, ids, documents, metadatas, model_name))
+                submitted += len(ids)
+
+            while len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    write(future)
+
+            if max_chunks_per_sec:
+                # Throttle on chunks actually re-embedded, not ones a previous run already copied
+                ahead = submitted / max_chunks_per_sec - (time.monotonic() - start)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+        for future in pending:
+            write(future)
+
+    if shadow.count() < source.count():
+        raise RuntimeError(f"Shadow index {shadow_name} is incomplete; re-run to resume")
+
+    old_collection = pointer["collection"]
+    set_pointer(index_name, shadow_name, model_name)
+    progress(f"{index_name} now reads from {shadow_name} ({model_name})")
+    if drop_old:
+        # Readers and writers hold the old pointer and handle for up to a TTL
+        time.sleep(POINTER_TTL_SECONDS)
+        client.delete_collection(name=old_collection)
+        progress(f"Deleted {old_collection}")
+
+    elapsed = time.monotonic() - start
+    return {
+        "copied": copied,
+        "skipped": skipped,
+        "elapsed_s": round(elapsed, 2),
+        "chunks_per_sec": round(copied / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+def status(index_name: str) -> Dict:
+    """Current pointer plus shadow progress, if a re-index is running."""
+    pointer = get_pointer(index_name, use_cache=False)
+    result = dict(pointer)
+    if pointer["shadow_collection"]:
+        metadata = client.get_collection(name=pointer["shadow_collection"]).metadata or {}
+        result["progress"] = {"reindexed": metadata.get("reindexed", 0), "total": metadata.get("total", 0)}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("index", help="Logical index name, e.g. medical_docs")
+    parser.add_argument("--model", choices=sorted(EMBEDDING_MODELS), help="Embedding model to migrate to")
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--max-chunks-per-sec", type=float, default=0)
+    parser.add_argument("--drop-old", action="store_true", help="Delete the old collection after switching")
+    parser.add_argument("--status", action="store_true", help="Show the index pointer and progress")
+    args = parser.parse_args()
+
+    if args.status:
+        print(status(args.index))
+        return
+    if not args.model:
+        parser.error("--model is required unless --status is given")
+    result = reindex(
+        args.index,
+        args.model,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        max_chunks_per_sec=args.max_chunks_per_sec,
+        drop_old=args.drop_old,
+    )
+    print(result)
+
+
+if __name__ == "__main__":
+    main()
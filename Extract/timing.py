@@ -0,0 +1,23 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+
+@contextmanager
+def stage(timings: Optional[Dict[str, float]], name: str):
+    """
+    Add the wall time of the block to timings[name] in milliseconds.
+
+    Does nothing when timings is None, so callers can pass it through unconditionally.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    """Format stage timings as a Server-Timing header value."""
+    return ", ".join(f"{name};dur={ms:.1f}" for name, ms in timings.items())
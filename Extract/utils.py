@@ -1,7 +1,7 @@
 from typing import List
-from sentence_transformers import SentenceTransformer
-from Extract.vector_db import client  # Replace 'chroma_collection' with your actual collection object
+from Extract.embedder import embed_texts
 from Extract.extractor import extract_text_from_pdf
+from Extract.index import retry_on_switch, write_targets
 
 
 
@@ -38,25 +38,36 @@ def split_text(text: str, max_length: int = 500) -> List[str]:
     """
     return [text[i : i + max_length] for i in range(0, len(text), max_length)]
 
-def store_chunks_in_chroma(text_chunks: List[str], collection_name: str = "default"):
-    collection = client.get_or_create_collection(name=collection_name)
+def store_chunks_in_chroma(text_chunks: List[str], collection_name: str = "default", doc_id: str = "chunk"):
     """
-    Vectorizes text chunks using SentenceTransformer and stores them in Chroma DB.
+    Vectorizes text chunks and stores them in the Chroma DB index.
+
+    Chunks are embedded with the model the index is currently on and tagged
+    with that model's name. During a re-index they are also written to the
+    shadow collection with the new model (see Extract/reindex.py).
 
     Args:
         text_chunks: List of text chunks to vectorize and store.
-        collection_name: Name of the Chroma DB collection to store vectors in.
+        collection_name: Name of the index to store vectors in.
+        doc_id: Prefix for chunk IDs (e.g. the upload's content hash) so
+            separate documents don't overwrite each other's chunks.
     """
-    model = SentenceTransformer("all-MiniLM-L6-v2")
-    embeddings = model.encode(text_chunks, show_progress_bar=True)
-    # Store each chunk with its embedding
-    for idx, (chunk, embedding) in enumerate(zip(text_chunks, embeddings)):
-        collection.add(
-            ids=[f"chunk_{idx}"],
-            embeddings=[embedding.tolist()],
-            documents=[chunk]
-        )
-       
+    if not text_chunks:
+        return
+    ids = [f"{doc_id}_{idx}" for idx in range(len(text_chunks))]
+
+    def write():
+        for collection, model_name in write_targets(collection_name):
+            embeddings = embed_texts(text_chunks, model_name=model_name)
+            collection.upsert(
+                ids=ids,
+                embeddings=embeddings,
+                documents=text_chunks,
+                metadatas=[{"doc_id": doc_id, "embedding_model": model_name} for _ in ids]
+            )
+
+    # Upserts are idempotent, so a retry after a re-index switch just rewrites the same ids
+    retry_on_switch(collection_name, write)
 
     print(f"Stored {len(text_chunks)} chunks in Chroma DB collection: {collection_name}")
 
@@ -8,12 +8,17 @@ dotenv.load_dotenv()
 
 
 chromakey = os.getenv("CHROMA_API_KEY")
+chroma_path = os.getenv("CHROMA_PATH")
 
-client = chromadb.CloudClient(
-  api_key=chromakey,
-  tenant='',
-  database='cicadadb'
-)
+if chroma_path:
+  # Local on-disk store (offline development and benchmarks)
+  client = chromadb.PersistentClient(path=chroma_path)
+else:
+  client = chromadb.CloudClient(
+    api_key=chromakey,
+    tenant='',
+    database='cicadadb'
+  )
 
 # Create or get collection for storing vectors
 collection = client.get_or_create_collection(name="document_vectors")
@@ -1,9 +1,14 @@
+import os
 from google.cloud import firestore
 from google.oauth2 import service_account
 # Ensure 'upload.py' is in the same directory as this file or update the import path accordingly.
 
-cred = service_account.Credentials.from_service_account_file("D:/CareStack/service.json")
-db = firestore.Client(credentials=cred, project=cred.project_id)
+if os.getenv("FIRESTORE_EMULATOR_HOST"):
+    # The client picks up the emulator host itself and needs no credentials
+    db = firestore.Client(project=os.getenv("FIRESTORE_PROJECT", "carehack-local"))
+else:
+    cred = service_account.Credentials.from_service_account_file("D:/CareStack/service.json")
+    db = firestore.Client(credentials=cred, project=cred.project_id)
 
 def check_user_exists(user_id: str) -> bool:
     """Check if a user exists in the Firestore database."""
@@ -6,7 +6,7 @@ import re
 import json
 from Firebase.firebasehelper import add_medications_to_firestore, remove_expired_medications
 from google.cloud import firestore
-from google.oauth2 import service_account
+from Firebase.fb import db
 
 def parse_duration_to_days(duration):
     """Convert strings like '3 days', '2 weeks', '1 month' into number of days."""
@@ -57,10 +57,6 @@ def get_medications_with_end_dates(record, today_str="2025-08-03"):
 
 
 
-# Load credentials
-cred = service_account.Credentials.from_service_account_file("D:/CareStack/service.json")
-db = firestore.Client(credentials=cred, project=cred.project_id)
-
 def add_medical_info_to_firestore(extracted_data: dict, patient_id: str = "329823"): 
     patient_ref = db.collection("patients").document(patient_id)
 
@@ -1,17 +1,21 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.responses import JSONResponse
-import shutil
+import hashlib
 import os
 from datetime import datetime
-from uuid import uuid4
-from Extract.extractor import extract_text  # Adjust the import based on your project structure
+from Extract.extractor import extract_text_from_upload  # Adjust the import based on your project structure
 from Extract.utils import split_text, store_chunks_in_chroma  # Adjust the import based on your project structure
+from Extract.timing import stage, server_timing
 from Firebase.firebasehelper import add_medications_to_firestore    
 from Firebase.jsonextract import get_medications_with_end_dates
 from AI.function import extract_medical_info  # Adjust the import based on your project structure
 from pydantic import BaseModel 
 from Extract.rag import rag_query  # Adjust the import based on your project structure
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
+from anyio import CapacityLimiter, to_thread
+from functools import partial
+from AI.scheduler import scheduler, LLMOverloaded
 from Extract.vector_db import client
 from Firebase.fb import db  # Adjust the import based on your project structure
 from  ParserGen.parse import parse_medical_record  # Adjust the import based on your project structure
@@ -19,7 +23,51 @@ from ParserGen.upload import upload_to_firestore, remove_expired_medications  #
 
 
 
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 20 * 1024 * 1024))  # 20 MB
+# Room for the multipart boundaries and part headers around the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Reject /upload/ bodies over MAX_UPLOAD_BYTES before Starlette parses them.
+
+    Requests are turned away up front by Content-Length; bodies without one
+    (chunked) are cut off as soon as they pass the limit, so an oversize file
+    is never spooled in full.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != "/upload/":
+            await self.app(scope, receive, send)
+            return
+
+        limit = MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > limit:
+            response = JSONResponse(status_code=413, content={"detail": "File too large"})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(status_code=413, detail="File too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
 app = FastAPI()
+app.add_middleware(UploadSizeLimitMiddleware)
 # Allow CORS for all origins
 app.add_middleware(
     CORSMiddleware,
@@ -36,46 +84,87 @@ class QueryRequest(BaseModel):
 class SignupRequest(BaseModel):
     user_id: str
 
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Content type -> extension used to route extraction (the filename isn't trusted)
+ALLOWED_TYPES = {"application/pdf": "pdf", "image/png": "png", "image/jpeg": "jpeg"}
+UPLOAD_CHUNK_BYTES = 256 * 1024
+# Threads for upload processing, separate from the shared threadpool (40) that /query/ uses
+upload_limiter = CapacityLimiter(int(os.getenv("UPLOAD_WORKERS", 8)))
+
+
+async def hash_upload(file: UploadFile) -> str:
+    """
+    SHA-256 of an upload, read in bounded chunks from Starlette's own spool.
+
+    Starlette has already parsed the multipart body into file.file (kept in
+    memory up to 1 MB, spilled to a temp file above that); it is hashed in
+    place and rewound, and extraction reads the same file, so the body is
+    never copied again. Oversize bodies are turned away before this by
+    UploadSizeLimitMiddleware.
+
+    Returns:
+        Hex SHA-256 of the upload body.
+    """
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="File too large")
+
+    digest = hashlib.sha256()
+    await file.seek(0)
+    while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+        digest.update(chunk)
+    await file.seek(0)
+    return digest.hexdigest()
+
 
 @app.post("/upload/")
 async def upload_file(file: UploadFile = File(...),user_id: str = "default_user"):
-    if file.content_type not in ["application/pdf", "image/png", "image/jpeg"]:
+    if file.content_type not in ALLOWED_TYPES:
         raise HTTPException(status_code=400, detail="Unsupported file type")
+    extension = ALLOWED_TYPES[file.content_type]
+    # Shed here, like the LLM scheduler does, rather than queue without bound for a thread
+    if upload_limiter.statistics().tasks_waiting >= scheduler.max_queue:
+        raise HTTPException(status_code=503, detail="Too many uploads in progress", headers={"Retry-After": "5"})
 
-    
-    # Generate a unique file path
-    extension = file.filename.split('.')[-1]
-    dir = os.path.join(UPLOAD_DIR, user_id)
-    temp_file_path = os.path.join(UPLOAD_DIR, f"{uuid4()}.{extension}")
-
-    # Save the file temporarily
-    with open(temp_file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    timings = {}
+    with stage(timings, "read"):
+        content_hash = await hash_upload(file)
 
     try:
-        # Run your extraction logic
-        remove_expired_medications(user_id=user_id)  # Clean up expired medications
-         # Extract text from the file
-        extracted_text =  extract_text(temp_file_path)
-        medical_info =  extract_medical_info(extracted_text)
-        parsed_info = parse_medical_record(medical_info)
-        upload_to_firestore(user_id, parsed_info)
-    
-
-        if not extracted_text:
-            raise HTTPException(status_code=500, detail="No text extracted from the file")
-        text_chunks = split_text(extracted_text, max_length=500)
-        store_chunks_in_chroma(text_chunks, collection_name="medical_docs")
-
+        # Blocking SDK calls run off the event loop, on threads of their own so
+        # uploads queued behind the LLM scheduler can't starve chat of threads
+        extracted_text = await to_thread.run_sync(
+            partial(process_upload, file.file, extension, user_id, content_hash, timings), limiter=upload_limiter
+        )
+    except LLMOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after) + 1)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Extraction failed: {str(e)}")
-    finally:
-        # Clean up the file after processing
-        os.remove(temp_file_path)
 
-    return JSONResponse(content={"extracted_text": extracted_text})
+    return JSONResponse(
+        content={"extracted_text": extracted_text, "sha256": content_hash},
+        headers={"Server-Timing": server_timing(timings)},
+    )
+
+
+def process_upload(buffer, extension: str, user_id: str, content_hash: str, timings: dict = None) -> str:
+    """Extraction pipeline for one upload; returns the extracted text and fills timings per stage."""
+    # Run your extraction logic
+    with stage(timings, "expire_meds"):
+        remove_expired_medications(user_id=user_id)  # Clean up expired medications
+    # Extract text straight from the upload buffer (PyMuPDF / Azure Vision read it without copying)
+    with stage(timings, "extract_text"):
+        extracted_text =  extract_text_from_upload(buffer, extension)
+    with stage(timings, "llm_extract"):
+        medical_info =  extract_medical_info(extracted_text, user_id=user_id)
+    parsed_info = parse_medical_record(medical_info)
+    with stage(timings, "firestore"):
+        upload_to_firestore(user_id, parsed_info)
+
+    if not extracted_text:
+        raise HTTPException(status_code=500, detail="No text extracted from the file")
+    text_chunks = split_text(extracted_text, max_length=500)
+    with stage(timings, "embed_store"):
+        store_chunks_in_chroma(text_chunks, collection_name="medical_docs", doc_id=content_hash)
+    return extracted_text
 
 
 
@@ -87,9 +176,25 @@ async def handle_query(req: QueryRequest):
 
     # --- Your logic here ---
     # For example: answer = run_llm(user_query)
-    answer = rag_query(user_query,  collection_name=user_id, top_k=3)
-
-    return JSONResponse(content={"response": answer})
+    timings = {}
+    stats = {}
+    try:
+        answer = await run_in_threadpool(
+            rag_query, user_query, collection_name=user_id, top_k=3, user_id=user_id, timings=timings, stats=stats
+        )
+    except LLMOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after) + 1)})
+
+    return JSONResponse(
+        content={"response": answer},
+        headers={"Server-Timing": server_timing(timings), "X-Context-Tokens": str(stats.get("context_tokens", 0))},
+    )
+
+
+@app.get("/metrics/llm")
+async def llm_metrics():
+    """Queue depth, wait times, shed requests and 429 backoff state of the LLM scheduler."""
+    return JSONResponse(content=scheduler.metrics())
 
 
 @app.get("/update_medications/")
@@ -0,0 +1,82 @@
+import pytest
+
+import Extract.context as context
+from Extract.context import build_context, deduplicate, pack, rerank, simhash
+
+RECORD = (
+    "Patient: Jane Doe. Diagnosis: type 2 diabetes mellitus with peripheral neuropathy. "
+    "Medications: 1. Metformin 500 mg - twice daily x 90 days. 2. Gabapentin 300 mg - nightly x 30 days. "
+    "Known allergies: penicillin, latex."
+)
+# The same record extracted again with different line breaks, case and punctuation
+REEXTRACTED = RECORD.upper().replace(". ", ".\n").replace(",", " ,")
+OTHER_RECORD = (
+    "Radiology report: chest x-ray shows no acute cardiopulmonary process. "
+    "Heart size is normal and the lungs are clear."
+)
+
+
+class FakeCrossEncoder:
+    """Scores a pair by shared words and records every pair it is asked about."""
+
+    def __init__(self):
+        self.pairs = []
+
+    def predict(self, pairs):
+        self.pairs.extend(pairs)
+        return [len(set(query.lower().split()) & set(chunk.lower().split())) for query, chunk in pairs]
+
+
+@pytest.fixture
+def cross_encoder(monkeypatch):
+    model = FakeCrossEncoder()
+    monkeypatch.setattr(context, "get_cross_encoder", lambda model_name: model)
+    monkeypatch.setattr(context, "_score_cache", context._ScoreCache(16))
+    return model
+
+
+def test_near_duplicates_are_dropped_and_distinct_chunks_kept():
+    assert bin(simhash(RECORD) ^ simhash(REEXTRACTED)).count("1") <= context.SIMHASH_MAX_DISTANCE
+    assert bin(simhash(RECORD) ^ simhash(OTHER_RECORD)).count("1") > context.SIMHASH_MAX_DISTANCE
+
+    assert deduplicate([RECORD, OTHER_RECORD, REEXTRACTED]) == [RECORD, OTHER_RECORD]
+
+
+def test_pack_skips_a_chunk_too_large_and_keeps_smaller_later_ones():
+    small, large, later = "a" * 160, "b" * 800, "c" * 160  # 40, 200 and 40 estimated tokens
+
+    assert pack([small, large, later], token_budget=100) == [small, later]
+    assert pack([large], token_budget=100) == []
+
+
+def test_rerank_orders_by_score_and_reuses_cached_scores(cross_encoder):
+    query = "metformin dose for jane"
+    chunks = ["the radiology report", "jane takes metformin", "metformin 500 mg"]
+
+    assert rerank(query, chunks, model_name="fake") == ["jane takes metformin", "metformin 500 mg", "the radiology report"]
+    assert len(cross_encoder.pairs) == 3
+
+    rerank(query, chunks, model_name="fake")
+    assert len(cross_encoder.pairs) == 3
+
+    rerank(query, chunks + ["new chunk"], model_name="fake")
+    assert cross_encoder.pairs[3:] == [(query, "new chunk")]
+
+
+def test_rerank_without_a_model_keeps_retrieval_order(cross_encoder):
+    chunks = ["second best", "best"]
+
+    assert rerank("best", chunks, model_name="") == chunks
+    assert cross_encoder.pairs == []
+
+
+def test_build_context_reports_what_it_kept(cross_encoder):
+    stats, timings = {}, {}
+
+    result = build_context("metformin", [OTHER_RECORD, RECORD, REEXTRACTED], token_budget=60,
+                           timings=timings, stats=stats)
+
+    # Reranked ahead of the radiology report, which then no longer fits
+    assert result == RECORD
+    assert stats == {"candidates": 3, "unique": 2, "packed": 1, "context_tokens": len(RECORD) // 4}
+    assert set(timings) == {"dedupe", "rerank"}
@@ -0,0 +1,157 @@
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+# Extract.vector_db picks its client at import time: use a throwaway local store
+os.environ.setdefault("CHROMA_PATH", tempfile.mkdtemp(prefix="carehack-test-chroma-"))
+
+from chromadb.errors import NotFoundError
+
+import Extract.index as index
+import Extract.reindex as reindex
+from Extract.embedder import EMBEDDING_MODELS, LEGACY_EMBEDDING_MODEL
+from Extract.vector_db import client
+
+
+def fake_embed(texts, model_name=""):
+    return [[float(b) for b in hashlib.sha256(f"{model_name}:{text}".encode()).digest()[:8]] for text in texts]
+
+
+@pytest.fixture(autouse=True)
+def fake_models(monkeypatch):
+    monkeypatch.setitem(EMBEDDING_MODELS, "fake-v2", "fake")
+    monkeypatch.setattr(reindex, "embed_texts", fake_embed)
+    # Same code path as the process pool, without pickling the patched embedder
+    monkeypatch.setattr(reindex, "ProcessPoolExecutor", ThreadPoolExecutor)
+    monkeypatch.setattr(index, "POINTER_TTL_SECONDS", 0.2)
+    monkeypatch.setattr(reindex, "POINTER_TTL_SECONDS", 0.2)
+    index._cache.clear()
+
+
+def make_index(name, count):
+    collection = client.create_collection(name=name)
+    documents = [f"{name} chunk {i}" for i in range(count)]
+    collection.add(
+        ids=[f"doc_{i}" for i in range(count)],
+        documents=documents,
+        embeddings=fake_embed(documents, LEGACY_EMBEDDING_MODEL),
+        metadatas=[{"doc_id": "doc"} for _ in documents],
+    )
+    return collection
+
+
+def test_bare_collection_resolves_to_legacy_model():
+    make_index("legacy_idx", 3)
+
+    pointer = index.get_pointer("legacy_idx")
+
+    assert pointer["collection"] == "legacy_idx"
+    assert pointer["model"] == LEGACY_EMBEDDING_MODEL
+    assert pointer["persisted"]
+
+
+def test_new_index_records_its_pointer_on_first_write():
+    expected = index.versioned_collection_name("new_idx", index.DEFAULT_EMBEDDING_MODEL)
+    assert index.get_pointer("new_idx") == {
+        "collection": expected, "model": index.DEFAULT_EMBEDDING_MODEL,
+        "shadow_collection": "", "shadow_model": "", "persisted": False,
+    }
+
+    [(collection, model)] = index.write_targets("new_idx")
+
+    assert collection.name == expected and model == index.DEFAULT_EMBEDDING_MODEL
+    index._cache.clear()
+    assert index.get_pointer("new_idx")["persisted"]
+
+
+def test_persisted_alias_wins_over_bare_collection():
+    make_index("aliased_idx", 1)
+    client.create_collection(name="aliased_idx__fake-v2")
+    index.set_pointer("aliased_idx", "aliased_idx__fake-v2", "fake-v2")
+
+    collection, model = index.resolve_index("aliased_idx")
+
+    assert collection.name == "aliased_idx__fake-v2"
+    assert model == "fake-v2"
+
+
+def test_write_targets_include_shadow_during_reindex():
+    make_index("dual_idx", 1)
+    client.create_collection(name="dual_idx__fake-v2")
+    index.set_pointer("dual_idx", "dual_idx", LEGACY_EMBEDDING_MODEL, "dual_idx__fake-v2", "fake-v2")
+
+    targets = index.write_targets("dual_idx")
+
+    assert [(c.name, m) for c, m in targets] == [
+        ("dual_idx", LEGACY_EMBEDDING_MODEL),
+        ("dual_idx__fake-v2", "fake-v2"),
+    ]
+
+
+def test_reindex_resumes_without_recopying(monkeypatch):
+    make_index("resume_idx", 10)
+    shadow = client.create_collection(name="resume_idx__fake-v2")
+    shadow.add(ids=["doc_0", "doc_1", "doc_2"], documents=["a", "b", "c"], embeddings=fake_embed(["a", "b", "c"]))
+    embedded = []
+    monkeypatch.setattr(reindex, "embed_texts", lambda texts, model_name: embedded.extend(texts) or fake_embed(texts))
+
+    result = reindex.reindex("resume_idx", "fake-v2", batch_size=4, workers=1, progress=lambda line: None)
+
+    assert (result["copied"], result["skipped"]) == (7, 3)
+    assert len(embedded) == 7
+    assert index.resolve_index("resume_idx")[0].name == "resume_idx__fake-v2"
+    assert shadow.count() == 10
+
+
+def test_drop_old_waits_out_cached_pointers_and_readers_recover():
+    make_index("drop_idx", 5)
+    stale_handle, _ = index.resolve_index("drop_idx")
+    lines = []
+
+    reindex.reindex("drop_idx", "fake-v2", workers=1, drop_old=True, progress=lambda line: lines.append(line))
+
+    assert any(line.startswith("Deleted drop_idx") for line in lines)
+    with pytest.raises(NotFoundError):
+        client.get_collection(name="drop_idx")
+
+    # A reader still holding the deleted collection's handle re-resolves once
+    # instead of failing, and doesn't recreate the old collection
+    calls = []
+
+    def query():
+        handle = stale_handle if not calls else index.resolve_index("drop_idx")[0]
+        calls.append(handle.name)
+        return handle.count()
+
+    assert index.retry_on_switch("drop_idx", query) == 5
+    assert calls == ["drop_idx", "drop_idx__fake-v2"]
+    with pytest.raises(NotFoundError):
+        client.get_collection(name="drop_idx")
+
+
+def test_drop_old_deletes_only_after_pointer_ttl(monkeypatch):
+    make_index("ttl_idx", 2)
+    switched_at = {}
+    set_pointer = reindex.set_pointer
+
+    def record_switch(index_name, collection, model, *shadow):
+        set_pointer(index_name, collection, model, *shadow)
+        if not shadow:
+            switched_at["t"] = reindex.time.monotonic()
+
+    deleted_at = {}
+    delete_collection = client.delete_collection
+
+    def record_delete(name):
+        deleted_at["t"] = reindex.time.monotonic()
+        delete_collection(name=name)
+
+    monkeypatch.setattr(reindex, "set_pointer", record_switch)
+    monkeypatch.setattr(client, "delete_collection", record_delete)
+
+    reindex.reindex("ttl_idx", "fake-v2", workers=1, drop_old=True, progress=lambda line: None)
+
+    assert deleted_at["t"] - switched_at["t"] >= reindex.POINTER_TTL_SECONDS
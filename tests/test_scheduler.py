@@ -0,0 +1,190 @@
+import threading
+import time
+
+import httpx
+import pytest
+from openai import APITimeoutError, RateLimitError
+
+from AI.scheduler import BATCH, INTERACTIVE, LLMOverloaded, LLMScheduler
+
+REQUEST = httpx.Request("POST", "https://example.openai.azure.com/openai/deployments/gpt-4o/chat/completions")
+
+
+def make_scheduler(**kwargs):
+    options = dict(max_concurrency=8, global_rps=1000, per_user_rps=1000, tokens_per_minute=10**9, max_wait=10)
+    options.update(kwargs)
+    return LLMScheduler(**options)
+
+
+def rate_limited(retry_after):
+    response = httpx.Response(429, headers={"retry-after": str(retry_after)}, request=REQUEST)
+    return RateLimitError("Rate limit is exceeded.", response=response, body=None)
+
+
+def raising(error):
+    def call():
+        raise error
+    return call
+
+
+def start(scheduler, fn, **kwargs):
+    thread = threading.Thread(target=scheduler.run, args=(fn,), kwargs=kwargs)
+    thread.start()
+    return thread
+
+
+def wait_for_queue(scheduler, depth, priority="batch", timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while scheduler.metrics()["priorities"][priority]["queue_depth"] < depth:
+        assert time.monotonic() < deadline, "callers never queued"
+        time.sleep(0.01)
+
+
+def test_interactive_is_granted_before_queued_batch():
+    scheduler = make_scheduler(max_concurrency=1)
+    busy = threading.Event()
+    order = []
+    threads = [start(scheduler, busy.wait)]
+    time.sleep(0.05)
+    for i in range(3):
+        threads.append(start(scheduler, lambda i=i: order.append(f"batch{i}"), priority=BATCH, user_id=f"user{i}"))
+    wait_for_queue(scheduler, 3)
+    threads.append(start(scheduler, lambda: order.append("chat"), priority=INTERACTIVE, user_id="chat"))
+    wait_for_queue(scheduler, 1, "interactive")
+
+    busy.set()
+    for thread in threads:
+        thread.join()
+
+    assert order[0] == "chat"
+    assert sorted(order[1:]) == ["batch0", "batch1", "batch2"]
+
+
+def test_sheds_after_waiting_max_wait():
+    scheduler = make_scheduler(max_concurrency=1, max_wait=0.2)
+    busy = threading.Event()
+    holder = start(scheduler, busy.wait)
+    time.sleep(0.05)
+
+    begin = time.monotonic()
+    with pytest.raises(LLMOverloaded, match="Timed out"):
+        scheduler.run(lambda: None)
+    busy.set()
+    holder.join()
+
+    assert 0.2 <= time.monotonic() - begin < 1.0
+    assert scheduler.metrics()["priorities"]["batch"]["shed"] == 1
+
+
+def test_sheds_immediately_when_queue_is_full():
+    scheduler = make_scheduler(max_concurrency=1, max_queue=1)
+    busy = threading.Event()
+    threads = [start(scheduler, busy.wait), start(scheduler, lambda: None)]
+    wait_for_queue(scheduler, 1)
+
+    begin = time.monotonic()
+    with pytest.raises(LLMOverloaded, match="queue is full") as shed:
+        scheduler.run(lambda: None)
+    busy.set()
+    for thread in threads:
+        thread.join()
+
+    assert time.monotonic() - begin < 0.1
+    assert shed.value.retry_after > 0
+
+
+def test_rate_limit_halves_concurrency_and_honours_retry_after():
+    scheduler = make_scheduler(max_concurrency=8)
+    calls = []
+
+    def call():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise rate_limited(0.3)
+        return "ok"
+
+    assert scheduler.run(call) == "ok"
+    assert calls[1] - calls[0] >= 0.3
+    metrics = scheduler.metrics()
+    assert metrics["rate_limited"] == 1
+    assert metrics["concurrency_limit"] == 4
+
+
+def test_rate_limit_pauses_other_callers():
+    scheduler = make_scheduler(max_retries=0)
+    with pytest.raises(LLMOverloaded) as shed:
+        scheduler.run(raising(rate_limited(0.4)), user_id="throttled")
+    assert shed.value.retry_after == pytest.approx(0.4)
+
+    begin = time.monotonic()
+    scheduler.run(lambda: None, user_id="someone_else")
+
+    assert time.monotonic() - begin >= 0.3
+
+
+def test_per_user_limit_does_not_hold_up_other_users():
+    scheduler = make_scheduler(per_user_rps=2)
+    scheduler.run(lambda: None, user_id="busy")
+    scheduler.run(lambda: None, user_id="busy")
+
+    finished = {}
+    begin = time.monotonic()
+    throttled = threading.Thread(
+        target=lambda: finished.setdefault("busy", scheduler.run(time.monotonic, user_id="busy"))
+    )
+    throttled.start()
+    finished["other"] = scheduler.run(time.monotonic, user_id="other")
+    throttled.join()
+
+    # "busy" has used its burst of 2 and waits ~0.5s for a token; "other" doesn't
+    assert finished["other"] - begin < 0.2
+    assert finished["busy"] - begin >= 0.4
+
+
+def test_transient_errors_are_retried_without_cutting_concurrency():
+    scheduler = make_scheduler(max_retries=2)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise APITimeoutError(request=REQUEST)
+        return "ok"
+
+    assert scheduler.run(flaky) == "ok"
+    metrics = scheduler.metrics()
+    assert metrics["transient_errors"] == 2
+    assert metrics["concurrency_limit"] == 8
+
+    with pytest.raises(APITimeoutError):
+        make_scheduler(max_retries=0).run(raising(APITimeoutError(request=REQUEST)))
+
+
+def test_waiters_wake_after_pause_when_capacity_is_free():
+    scheduler = make_scheduler(max_concurrency=8, max_retries=0)
+    with pytest.raises(LLMOverloaded):
+        scheduler.run(raising(rate_limited(0.5)))
+    started = []
+
+    def call():
+        started.append(time.monotonic())
+        time.sleep(0.5)
+
+    begin = time.monotonic()
+    threads = [start(scheduler, call, priority=BATCH) for _ in range(4)]
+    for thread in threads:
+        thread.join()
+
+    # All four fit under the halved limit, so none should wait for another to finish
+    assert len(started) == 4
+    assert max(started) - begin < 0.9
+
+
+def test_idle_user_buckets_are_evicted():
+    scheduler = LLMScheduler(global_rps=10**6, per_user_rps=1000)
+    for i in range(5000):
+        scheduler.run(lambda: None, user_id=f"user_{i}")
+    time.sleep(0.01)
+    scheduler.run(lambda: None, user_id="fresh")
+
+    assert scheduler.metrics()["tracked_users"] < 2 * 1024